@@ -0,0 +1,70 @@
+"""Jednorazowy krok budowania: ustala wymiar batcha modelu ONNX na MAX_INFERENCE_BATCH_SIZE.
+
+Przy stałym kształcie wejścia ORT może reużywać plan wykonania i memory pattern między
+wywołaniami Run; API dopełnia ostatni, krótszy batch zerami i odcina nadmiarowe wyniki.
+Kwantyzację (api/quantize_model.py) uruchamiamy wcześniej - kalibracja podaje po 1 obrazie.
+Ten sam efekt bez zmiany plików daje ORT_FIXED_BATCH=1 w API (override przy ładowaniu sesji).
+
+Wymaga pakietu onnx:
+    pip install -r api/requirements-tools.txt
+
+Użycie (z katalogu głównego repo; domyślnie zapisuje obok, np. asbestos_net_b32.onnx):
+    python -m api.fix_batch_model
+    python -m api.fix_batch_model --model artifacts/asbestos_net.onnx --batch-size 32
+    python -m api.fix_batch_model --overwrite  # nadpisuje artefakty ładowane przez API
+"""
+import argparse
+import os
+
+import onnx
+
+REPO_ROOT = os.path.normpath(os.path.join(os.path.dirname(__file__), '..'))
+DEFAULT_MODELS = [
+    os.path.join(REPO_ROOT, 'artifacts', 'asbestos_net.onnx'),
+    os.path.join(REPO_ROOT, 'artifacts', 'asbestos_net_int8.onnx'),
+]
+DEFAULT_BATCH_SIZE = 32  # = MAX_INFERENCE_BATCH_SIZE w api/main.py
+
+
+def fix_batch_dim(model_path: str, output_path: str, batch_size: int):
+    model = onnx.load(model_path)
+    graph = model.graph
+    initializer_names = {init.name for init in graph.initializer}
+
+    for value in list(graph.input) + list(graph.output):
+        if value.name in initializer_names:
+            continue
+        value.type.tensor_type.shape.dim[0].dim_value = batch_size
+
+    # Kształty pośrednie z eksportu mają symboliczny batch - wyliczamy je od nowa
+    del graph.value_info[:]
+    model = onnx.shape_inference.infer_shapes(model)
+    onnx.checker.check_model(model)
+    onnx.save(model, output_path)
+    print(f"✓ Zapisano {output_path} (batch = {batch_size})")
+
+
+def _output_path(model_path: str, batch_size: int) -> str:
+    root, ext = os.path.splitext(model_path)
+    return f"{root}_b{batch_size}{ext}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stały wymiar batcha modelu ONNX")
+    parser.add_argument('--model', action='append', help="można podać wielokrotnie")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--overwrite', action='store_true', help="zapis w miejscu wejściowego pliku")
+    args = parser.parse_args()
+
+    model_paths = args.model or [path for path in DEFAULT_MODELS if os.path.exists(path)]
+    if not model_paths:
+        raise FileNotFoundError("Brak modeli ONNX do przetworzenia")
+    for path in model_paths:
+        output_path = path if args.overwrite else _output_path(path, args.batch_size)
+        if output_path != path and os.path.exists(output_path):
+            raise FileExistsError(f"{output_path} już istnieje")
+        fix_batch_dim(path, output_path, args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
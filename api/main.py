@@ -1,52 +1,155 @@
-import torch
-import torch.nn as nn
-import torchvision.transforms as transforms
+import os
+
+# Limity wątków BLAS/OpenMP muszą być ustawione PRZED importem numpy/onnxruntime -
+# inaczej każda biblioteka tworzy własną pulę wątków i rdzenie są przeciążone.
+# Równoległość zapewniają pule ORT (intra-op) i executory poniżej.
+os.environ.setdefault("OMP_NUM_THREADS", "1")
+os.environ.setdefault("MKL_NUM_THREADS", "1")
+os.environ.setdefault("OPENBLAS_NUM_THREADS", "1")
+# Bezczynne wątki OpenMP usypiają zamiast kręcić się w pętli (spin-wait pali CPU)
+os.environ.setdefault("OMP_WAIT_POLICY", "PASSIVE")
+# Jądro preprocessingu Numby: wbudowana warstwa workqueue (wywołania serializuje
+# _NORMALIZE_KERNEL_LOCK); warstwa TBB potrafi zawiesić zamykanie procesu
+os.environ.setdefault("NUMBA_THREADING_LAYER", "workqueue")
 
 import onnxruntime as ort
 import numpy as np
+import cv2
+from numba import njit, prange, set_num_threads
 import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor
 import logging
+import logging.handlers
+import queue
 import sys
+import threading
 
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-import aiohttp
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import JSONResponse
+import msgspec
+import cachetools
+import httpx
 import asyncio
-from PIL import Image
-from io import BytesIO
+import functools
 import math
-import os
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Tuple, Union
 
 # ====================================================================
 # APLIKACJA I METADANE
 # ====================================================================
 
-# Konfiguracja logowania - wypisywanie na konsolę
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(sys.stdout)
-    ]
-)
-logger = logging.getLogger(__name__)
-
-app = FastAPI(title="Asbestos Detection API")
+# Konfiguracja logowania - po imporcie (np. api/quantize_model.py) root loguje wprost na
+# konsolę. Na czas działania aplikacji (startup/shutdown) rekordy trafiają do kolejki,
+# a zapis wykonuje osobny wątek (QueueListener), więc event loop nie czeka na flush stdout.
+# W produkcji ustaw LOG_LEVEL=WARNING.
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+_log_queue: queue.SimpleQueue = queue.SimpleQueue()
+_console_handler = logging.StreamHandler(sys.stdout)
+_console_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+# QueueHandler bez własnego formatera: wstawia do kolejki sam tekst komunikatu,
+# a czas i poziom (z rekordu) dopisuje _console_handler w wątku listenera
+_queue_handler = logging.handlers.QueueHandler(_log_queue)
+LOG_LISTENER = logging.handlers.QueueListener(_log_queue, _console_handler)
+logging.basicConfig(level=LOG_LEVEL, handlers=[_console_handler])
+
+
+def _start_queued_logging():
+    root = logging.getLogger()
+    root.removeHandler(_console_handler)
+    root.addHandler(_queue_handler)
+    LOG_LISTENER.start()
+
+
+def _stop_queued_logging():
+    root = logging.getLogger()
+    root.removeHandler(_queue_handler)
+    LOG_LISTENER.stop()  # opróżnia kolejkę przed powrotem
+    root.addHandler(_console_handler)
+
+
+# Logger aplikacji pod stałą nazwą (niezależną od ścieżki modułu) - poziom sterowany LOG_LEVEL
+logger = logging.getLogger("asbestos")
+logger.setLevel(LOG_LEVEL)
+# httpx loguje każde żądanie na INFO - przy kilku kafelkach na współrzędną to zbędny koszt
+logging.getLogger("httpx").setLevel(logging.WARNING)
 
 # GLOBALNE KONSTANTY
 IMG_SIZE = 128
 ZOOM = 20
-MAX_WORKERS = 30
 MAX_CONCURRENT_REQUESTS = 50  # Optimized for CPU-bound ONNX inference
 MAX_INFERENCE_BATCH_SIZE = 32  # Max batch size for ONNX inference
 
+# Budżet rdzeni: jeden wątek wywołujący model.run (bez równoległych Run na jednej sesji),
+# a pula wątków intra-op ORT dostaje wszystkie rdzenie poza tymi dla preprocessingu
+# (skalujemy tym, nie --workers uvicorna).
+# Rdzenie dozwolone dla procesu (cpuset kontenera), nie wszystkie rdzenie hosta.
+if hasattr(os, 'sched_getaffinity'):
+    CPU_CORES = sorted(os.sched_getaffinity(0))
+else:
+    CPU_CORES = list(range(os.cpu_count() or 1))
+CPU_COUNT = len(CPU_CORES)
+ORT_PIN_THREADS = os.getenv("ORT_PIN_THREADS", "0") == "1"  # Przypinanie wątków ORT do rdzeni
+# Ustalenie symbolicznego batcha przy ładowaniu sesji (free dimension override) zamiast
+# api/fix_batch_model.py - ten sam plik .onnx, ORT dobiera kernele pod stały kształt
+ORT_FIXED_BATCH = os.getenv("ORT_FIXED_BATCH", "0") == "1"
+# Wątki jądra preprocessingu Numby - działa równolegle z model.run poprzedniego batcha,
+# więc dostaje tylko część rdzeni, reszta zostaje dla puli intra-op ORT
+PREP_NUM_THREADS = int(os.getenv("PREP_NUM_THREADS", str(max(1, CPU_COUNT // 4))))
+# Pula intra-op ORT: pozostałe rdzenie (co najmniej 1); przy ORT_PIN_THREADS przypinana
+# tylko do nich - pierwsze PREP_NUM_THREADS rdzeni zostaje dla Numby
+ORT_NUM_THREADS = max(1, CPU_COUNT - PREP_NUM_THREADS)
+ORT_CORES = CPU_CORES[PREP_NUM_THREADS:] or CPU_CORES
+# Wariant modelu: auto (int8 gdy jest plik i CPU ma VNNI), int8 (zawsze gdy jest plik), fp32
+MODEL_PRECISION = os.getenv("MODEL_PRECISION", "auto").lower()
+
+# cv2 ma własną pulę wątków - resize 128x128 jej nie potrzebuje
+cv2.setNumThreads(1)
+
 # 1. Zmieniony typ obiektu modelu na sesję ONNX Runtime
 MODEL: Optional[ort.InferenceSession] = None 
+# Stały wymiar batcha modelu (api/fix_batch_model.py lub ORT_FIXED_BATCH); None = batch dynamiczny
+MODEL_BATCH_SIZE: Optional[int] = None
+# Nazwy wejścia/wyjścia modelu - odczytane raz przy ładowaniu sesji, nie przy każdym żądaniu
+MODEL_INPUT_NAME: Optional[str] = None
+MODEL_OUTPUT_NAME: Optional[str] = None
+# Trwały IOBinding i prealokowany bufor logitów [MAX_INFERENCE_BATCH_SIZE, C] - używane
+# wyłącznie z jedynego wątku INFERENCE_EXECUTOR
+MODEL_IO_BINDING: Optional[ort.IOBinding] = None
+MODEL_OUTPUT_BUFFER: Optional[np.ndarray] = None
+
+# GLOBALNY KLIENT HTTP (reużywalny)
+GLOBAL_SESSION: Optional[httpx.AsyncClient] = None
+
+# CACHE ZDEKODOWANYCH KAFELKÓW: (zoom, x, y) -> BGR uint8 [256, 256, 3] (~192 KB na kafelek)
+TILE_CACHE_SIZE = int(os.getenv("TILE_CACHE_SIZE", "2000"))
+TILE_CACHE: cachetools.LRUCache = cachetools.LRUCache(maxsize=TILE_CACHE_SIZE)
 
-# GLOBALNA SESJA AIOHTTP (reużywalna)
-GLOBAL_SESSION: Optional[aiohttp.ClientSession] = None
+# Trwające pobrania kafelków - równoległe żądania tego samego kafelka czekają na jedno pobranie
+_TILE_INFLIGHT: Dict[Tuple[int, int, int], asyncio.Future] = {}
+
+
+class _DiskTileIndex(cachetools.LRUCache):
+    """LRU plików kafelków na dysku: (zoom, x, y) -> ścieżka.
+
+    Ścieżki wypchnięte z indeksu trafiają do `evicted`; pliki usuwa wywołujący
+    (_remove_tile_files w wątku), żeby os.remove nie blokował event loopa.
+    """
+
+    def __init__(self, maxsize: int):
+        super().__init__(maxsize=maxsize)
+        self.evicted: List[str] = []
+
+    def popitem(self):
+        key, path = super().popitem()
+        self.evicted.append(path)
+        return key, path
+
+
+# CACHE KAFELKÓW NA DYSKU (surowe bajty JPEG, przeżywa restart); domyślnie wyłączony -
+# włącza go ustawienie TILE_CACHE_DIR (np. /tmp/tiles)
+TILE_CACHE_DIR = os.getenv("TILE_CACHE_DIR", "")
+TILE_DISK_CACHE_SIZE = int(os.getenv("TILE_DISK_CACHE_SIZE", "50000"))  # ~20 KB na kafelek
+DISK_TILE_INDEX: _DiskTileIndex = _DiskTileIndex(maxsize=TILE_DISK_CACHE_SIZE)
 
 # SEMAFOR DO KONTROLI RÓWNOLEGŁOŚCI
 SEMAPHORE: Optional[asyncio.Semaphore] = None
@@ -54,6 +157,21 @@ SEMAPHORE: Optional[asyncio.Semaphore] = None
 # ThreadPoolExecutor dla CPU-bound ONNX inference
 INFERENCE_EXECUTOR: Optional[ThreadPoolExecutor] = None
 
+# ThreadPoolExecutor dla preprocessingu obrazów (NumPy zwalnia GIL w operacjach na tablicach)
+PREP_EXECUTOR: Optional[ThreadPoolExecutor] = None
+
+# Pula prealokowanych par buforów (uint8 [B, H, W, 3], float32 [B, C, H, W]) - surowe
+# wycinki trafiają do bufora uint8, a jądro Numba zapisuje wynik prosto do bufora wejściowego
+BATCH_BUFFERS: Optional[asyncio.Queue] = None
+
+# Micro-batching /predict: żądania (sesja, obraz, future) czekają w kolejce najwyżej MICRO_BATCH_WAIT_MS
+# (lub do zebrania MICRO_BATCH_SIZE obrazów; nie więcej niż MAX_INFERENCE_BATCH_SIZE - rozmiar buforów),
+# a równoległe wywołania są łączone w jeden batch inferencji
+MICRO_BATCH_SIZE = min(int(os.getenv("MICRO_BATCH_SIZE", str(MAX_INFERENCE_BATCH_SIZE))), MAX_INFERENCE_BATCH_SIZE)
+MICRO_BATCH_WAIT_MS = float(os.getenv("MICRO_BATCH_WAIT_MS", "5"))
+PREDICT_QUEUE: Optional[asyncio.Queue] = None
+PREDICT_WORKER: Optional[asyncio.Task] = None
+
 # 2. Poprawne, zsynchronizowane metadane normalizacyjne z checkpointa
 MODEL_META: Dict[str, Any] = {
     'input_shape': (3, 128, 128),
@@ -62,26 +180,38 @@ MODEL_META: Dict[str, Any] = {
 }
 
 # Prekalkulowane wartości dla szybszej normalizacji
-MEAN_NP = np.array(MODEL_META['mean'], dtype=np.float32).reshape(3, 1, 1)
-STD_NP = np.array(MODEL_META['std'], dtype=np.float32).reshape(3, 1, 1)
+MEAN_NP = np.asarray(MODEL_META['mean'], dtype=np.float32).reshape(3, 1)
+INV_STD_NP = (1.0 / np.asarray(MODEL_META['std'], dtype=np.float32)).reshape(3, 1)
 
+# Tablica LUT[c, v] = (v/255 - mean[c]) / std[c] dla wszystkich 256 wartości uint8 -
+# normalizacja piksela to jeden odczyt z tablicy zamiast arytmetyki zmiennoprzecinkowej
+NORM_LUT = (
+    (np.arange(256, dtype=np.float32)[None, :] / 255.0 - MEAN_NP) * INV_STD_NP
+).astype(np.float32)
 
-class PredictRequest(BaseModel):
+
+# Modele żądań/odpowiedzi są typu msgspec.Struct - dekodowanie/enkodowanie JSON w C,
+# bez kosztu walidacji Pydantic (przy /batch_predict: tysiące współrzędnych)
+class PredictRequest(msgspec.Struct):
     centroidLat: float
     centroidLng: float
 
 
-class CoordinateItem(BaseModel):
+class PredictResponse(msgspec.Struct):
+    isPotentiallyAsbestos: float
+
+
+class CoordinateItem(msgspec.Struct):
     centroidLat: float
     centroidLng: float
     id: Optional[str] = None  # Opcjonalne ID do identyfikacji
 
 
-class BatchPredictRequest(BaseModel):
+class BatchPredictRequest(msgspec.Struct):
     coordinates: List[CoordinateItem]
 
 
-class PredictionResult(BaseModel):
+class PredictionResult(msgspec.Struct, kw_only=True):
     centroidLat: float
     centroidLng: float
     id: Optional[str] = None
@@ -90,76 +220,169 @@ class PredictionResult(BaseModel):
     error: Optional[str] = None
 
 
-class BatchPredictResponse(BaseModel):
+class BatchPredictResponse(msgspec.Struct):
     results: List[PredictionResult]
     total: int
     successful: int
     failed: int
 
 
+PREDICT_REQUEST_DECODER = msgspec.json.Decoder(PredictRequest)
+BATCH_REQUEST_DECODER = msgspec.json.Decoder(BatchPredictRequest)
+JSON_ENCODER = msgspec.json.Encoder()
+
+
+class MsgspecJSONResponse(JSONResponse):
+    """Domyślna odpowiedź JSON enkodowana przez msgspec (w C) zamiast json ze stdlib."""
+
+    def render(self, content: Any) -> bytes:
+        return JSON_ENCODER.encode(content)
+
+
+app = FastAPI(title="Asbestos Detection API", default_response_class=MsgspecJSONResponse)
+
+# Trasy czytają surowe body i zwracają Response, więc FastAPI nie zna ich modeli -
+# schematy Structów generuje msgspec i dokładamy je do /openapi.json ręcznie
+OPENAPI_COMPONENTS: Dict[str, Any] = {}
+
+
+def _openapi_schema(struct_type: type) -> Dict[str, Any]:
+    """JSON Schema Structa jako $ref do components/schemas (definicje trafiają do OPENAPI_COMPONENTS)."""
+    (schema,), components = msgspec.json.schema_components(
+        (struct_type,), ref_template="#/components/schemas/{name}"
+    )
+    OPENAPI_COMPONENTS.update(components)
+    return schema
+
+
+def _openapi_json_body(struct_type: type) -> Dict[str, Any]:
+    return {"content": {"application/json": {"schema": _openapi_schema(struct_type)}}, "required": True}
+
+
+_default_openapi = app.openapi
+
+
+def _openapi() -> Dict[str, Any]:
+    if app.openapi_schema is None:
+        schema = _default_openapi()
+        schema.setdefault("components", {}).setdefault("schemas", {}).update(OPENAPI_COMPONENTS)
+    return app.openapi_schema
+
+
+app.openapi = _openapi
+
+
 # ====================================================================
 # FUNKCJE AKWIZYCJI OBRAZU I PRZETWARZANIA WSTĘPNEGO
 # ====================================================================
 
-async def get_aiohttp_session():
-    """Get or create global aiohttp session with optimized settings."""
+async def get_http_client() -> httpx.AsyncClient:
+    """Get or create the global HTTP/2 client with optimized settings."""
     global GLOBAL_SESSION
-    if GLOBAL_SESSION is None or GLOBAL_SESSION.closed:
-        connector = aiohttp.TCPConnector(
-            limit=300,  # Jeszcze większy limit
-            limit_per_host=100,
-            ttl_dns_cache=300,
-            force_close=False,
-            enable_cleanup_closed=True
+    if GLOBAL_SESSION is None or GLOBAL_SESSION.is_closed:
+        # HTTP/2: wszystkie kafelki z danego serwera mt0..mt3 idą jako strumienie jednego
+        # połączenia TLS - bez osobnych handshake'ów i blokowania head-of-line per połączenie
+        transport = httpx.AsyncHTTPTransport(
+            http2=True,
+            limits=httpx.Limits(max_connections=300, max_keepalive_connections=100, keepalive_expiry=60.0),
+            local_address="0.0.0.0",  # Tylko IPv4
         )
-        timeout = aiohttp.ClientTimeout(total=20, connect=5, sock_read=10)
-        GLOBAL_SESSION = aiohttp.ClientSession(
-            connector=connector,
-            timeout=timeout,
+        GLOBAL_SESSION = httpx.AsyncClient(
+            transport=transport,
+            timeout=httpx.Timeout(20.0, connect=5.0, read=10.0),
             headers={'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'}
         )
-        print(f"✓ Created aiohttp session with limit=300, limit_per_host=100")
+        logger.info("Created HTTP/2 client with max_connections=300, max_keepalive_connections=100")
     return GLOBAL_SESSION
 
 
 @app.on_event("startup")
 async def startup_event():
     """Initialize resources on startup."""
-    global SEMAPHORE, INFERENCE_EXECUTOR
+    global SEMAPHORE, INFERENCE_EXECUTOR, PREP_EXECUTOR, BATCH_BUFFERS, PREDICT_QUEUE, PREDICT_WORKER
+    _start_queued_logging()
     SEMAPHORE = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
-    print(f"✓ Semaphore initialized with {MAX_CONCURRENT_REQUESTS} concurrent requests")
+    logger.info("Semaphore initialized with %d concurrent requests", MAX_CONCURRENT_REQUESTS)
 
-    # Initialize thread pool for CPU-bound inference
-    import multiprocessing
-    cpu_count = multiprocessing.cpu_count()
-    INFERENCE_EXECUTOR = ThreadPoolExecutor(max_workers=cpu_count * 2)
-    print(f"✓ Inference executor initialized with {cpu_count * 2} threads (CPU cores: {cpu_count})")
+    if TILE_CACHE_DIR:
+        await asyncio.to_thread(_load_disk_tile_index)
+        logger.info("Disk tile cache at %s with %d tiles", TILE_CACHE_DIR, len(DISK_TILE_INDEX))
 
-    await get_aiohttp_session()
+    # Single dedicated ORT caller: batches are serialized, parallelism comes from intra-op threads
+    INFERENCE_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="inference")
+    logger.info(
+        "Inference executor initialized with 1 thread (CPU cores: %d, ORT intra-op threads: %d)",
+        CPU_COUNT, ORT_NUM_THREADS,
+    )
+
+    # Single preprocessing thread: one Numba kernel call per batch, parallel over PREP_NUM_THREADS
+    # (set_num_threads is per calling thread, so it is applied in the worker itself)
+    PREP_EXECUTOR = ThreadPoolExecutor(
+        max_workers=1,
+        thread_name_prefix="prep",
+        initializer=set_num_threads,
+        initargs=(PREP_NUM_THREADS,),
+    )
+    logger.info("Preprocessing executor initialized with 1 thread (Numba threads: %d)", PREP_NUM_THREADS)
+
+    # One buffer pair in model.run plus one being filled by preprocessing
+    _, height, width = MODEL_META['input_shape']
+    BATCH_BUFFERS = asyncio.Queue()
+    for _ in range(2):
+        BATCH_BUFFERS.put_nowait((
+            np.empty((MAX_INFERENCE_BATCH_SIZE, height, width, 3), dtype=np.uint8),
+            np.empty((MAX_INFERENCE_BATCH_SIZE, *MODEL_META['input_shape']), dtype=np.float32),
+        ))
+    # JIT compile (or load from cache) the preprocessing kernel before the first request
+    PREP_EXECUTOR.submit(
+        _normalize_batch_kernel,
+        np.zeros((1, height, width, 3), dtype=np.uint8),
+        NORM_LUT,
+        np.empty((1, *MODEL_META['input_shape']), dtype=np.float32),
+    ).result()
+
+    PREDICT_QUEUE = asyncio.Queue()
+    PREDICT_WORKER = asyncio.create_task(_predict_batch_worker())
+
+    await get_http_client()
 
     # Preload model
     try:
         model = get_model()
-        print(f"✓ Model loaded successfully")
-        print(f"  - Model inputs: {[i.name for i in model.get_inputs()]}")
-        print(f"  - Model outputs: {[o.name for o in model.get_outputs()]}")
+        logger.info(
+            "Model loaded successfully (inputs: %s, outputs: %s)",
+            [i.name for i in model.get_inputs()],
+            [o.name for o in model.get_outputs()],
+        )
+        _warmup_model(model)
     except Exception as e:
-        print(f"✗ Model not loaded on startup: {e}")
+        logger.error("Model not loaded on startup: %s", e)
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Cleanup resources on shutdown."""
-    global GLOBAL_SESSION, INFERENCE_EXECUTOR
-    if GLOBAL_SESSION and not GLOBAL_SESSION.closed:
-        await GLOBAL_SESSION.close()
+    global GLOBAL_SESSION, INFERENCE_EXECUTOR, PREP_EXECUTOR
+    if PREDICT_WORKER:
+        PREDICT_WORKER.cancel()
+    if GLOBAL_SESSION and not GLOBAL_SESSION.is_closed:
+        await GLOBAL_SESSION.aclose()
     if INFERENCE_EXECUTOR:
         INFERENCE_EXECUTOR.shutdown(wait=True)
+    if PREP_EXECUTOR:
+        PREP_EXECUTOR.shutdown(wait=True)
+    _stop_queued_logging()
 
 
+# Liczba kafelków na osi dla stałego ZOOM - liczona raz
+TILES_AT_ZOOM = 2.0 ** ZOOM
+
+
+@functools.lru_cache(maxsize=4096)
 def lat_lng_to_pixel_in_tile(lat, lng, zoom):
+    # Cache kluczowany surowymi współrzędnymi - wynik identyczny z lat_lng_to_pixel_in_tile_batch
     lat_rad = math.radians(lat)
-    n = 2.0 ** zoom
+    n = TILES_AT_ZOOM if zoom == ZOOM else 2.0 ** zoom
     x = (lng + 180.0) / 360.0 * n
     y = (1.0 - math.asinh(math.tan(lat_rad)) / math.pi) / 2.0 * n
 
@@ -172,73 +395,281 @@ def lat_lng_to_pixel_in_tile(lat, lng, zoom):
     return x_tile, y_tile, pixel_x, pixel_y
 
 
-async def download_satellite_image(lat, lng, size=128, zoom=20):
-    start_time = time.time()
-    x_tile, y_tile, pixel_x, pixel_y = lat_lng_to_pixel_in_tile(lat, lng, zoom)
-    
-    tile_size = 256
-    tiles_needed = 3
-    combined_size = tile_size * tiles_needed
-    combined_image = Image.new('RGB', (combined_size, combined_size))
-
-    # Przygotowanie listy kafelków do pobrania
-    tiles_to_download = []
-    timestamp = int(time.time() * 1000)
-    for i in range(tiles_needed):
-        for j in range(tiles_needed):
-            tx = x_tile - tiles_needed // 2 + i
-            ty = y_tile - tiles_needed // 2 + j
-            url = f"https://mt1.google.com/vt/lyrs=s&x={tx}&y={ty}&z={zoom}&ts={timestamp}"
-            tiles_to_download.append((url, i, j))
+def lat_lng_to_pixel_in_tile_batch(lats: np.ndarray, lngs: np.ndarray, zoom: int) -> np.ndarray:
+    """Vectorized lat_lng_to_pixel_in_tile for many points at once.
+
+    Returns an int64 array of shape [N, 4] with rows (x_tile, y_tile, pixel_x, pixel_y).
+    """
+    n = TILES_AT_ZOOM if zoom == ZOOM else 2.0 ** zoom
+    x = (np.asarray(lngs, dtype=np.float64) + 180.0) / 360.0 * n
+    lat_rad = np.radians(np.asarray(lats, dtype=np.float64))
+    y = (1.0 - np.arcsinh(np.tan(lat_rad)) / np.pi) / 2.0 * n
+
+    # Współrzędne są dodatnie, więc astype (obcięcie) == int() z wersji skalarnej
+    x_tile = x.astype(np.int64)
+    y_tile = y.astype(np.int64)
+    pixel_x = ((x - x_tile) * 256).astype(np.int64)
+    pixel_y = ((y - y_tile) * 256).astype(np.int64)
+    return np.stack([x_tile, y_tile, pixel_x, pixel_y], axis=1)
+
+
+def _crop_window(tile_position, size: int, tile_size: int = 256) -> Tuple[int, int, List[Tuple[int, int]]]:
+    """Lewy górny róg cropa w globalnych współrzędnych pikselowych i przecinane przez niego kafelki."""
+    x_tile, y_tile, pixel_x, pixel_y = tile_position
+    # Okno cropa wyśrodkowane na punkcie
+    left = x_tile * tile_size + pixel_x - size // 2
+    top = y_tile * tile_size + pixel_y - size // 2
+
+    # Tylko kafelki przecinające crop (1-4 dla size <= 256) zamiast pełnej siatki 3x3
+    tiles_needed = [
+        (tx, ty)
+        for ty in range(top // tile_size, (top + size - 1) // tile_size + 1)
+        for tx in range(left // tile_size, (left + size - 1) // tile_size + 1)
+    ]
+    return left, top, tiles_needed
 
-    # Użycie globalnej sesji
-    session = await get_aiohttp_session()
-    tasks = [_download_tile(session, url, i, j, tile_size) for url, i, j in tiles_to_download]
-    
-    tile_download_start = time.time()
-    tile_results = await asyncio.gather(*tasks, return_exceptions=True)
-    tile_download_time = time.time() - tile_download_start
-    
-    # Wklejanie pobranych kafelków
-    for result in tile_results:
-        if isinstance(result, Exception):
-            continue
-        if result is not None:
-            tile_img, i, j = result
-            combined_image.paste(tile_img, (i * tile_size, j * tile_size))
 
-    center_x = (tiles_needed // 2) * tile_size + pixel_x
-    center_y = (tiles_needed // 2) * tile_size + pixel_y
+def _plan_batch_tiles(tile_positions, size: int, zoom: int) -> Dict[Tuple[int, int, int], list]:
+    """Kafelki batcha: (zoom, tx, ty) -> [task pobierający kafelek lub None, liczba cropów, które go jeszcze potrzebują]."""
+    batch_tiles: Dict[Tuple[int, int, int], list] = {}
+    for tile_position in tile_positions:
+        for tx, ty in _crop_window(tile_position, size)[2]:
+            batch_tiles.setdefault((zoom, tx, ty), [None, 0])[1] += 1
+    return batch_tiles
 
-    half_size = size // 2
-    left = center_x - half_size
-    top = center_y - half_size
-    right = left + size
-    bottom = top + size
 
-    cropped = combined_image.crop((left, top, right, bottom))
-    
-    total_time = time.time() - start_time
-    
+async def download_satellite_image(lat, lng, size=128, zoom=20, tile_position=None, batch_tiles=None):
+    """BGR crop of size x size pixels centered on (lat, lng).
+
+    tile_position: (x_tile, y_tile, pixel_x, pixel_y) precomputed by
+    lat_lng_to_pixel_in_tile_batch; computed here when not given.
+    batch_tiles: plan from _plan_batch_tiles shared by all crops of one batch request -
+    each distinct tile is fetched once per batch, even if it was already evicted from
+    TILE_CACHE, and released as soon as the last crop using it has been assembled.
+    """
+    if tile_position is None:
+        tile_position = lat_lng_to_pixel_in_tile(lat, lng, zoom)
+
+    tile_size = 256
+    left, top, tiles_needed = _crop_window(tile_position, size, tile_size)
+
+    # Użycie globalnej sesji
+    session = await get_http_client()
+    if batch_tiles is None:
+        tasks = [_get_tile(session, zoom, tx, ty, tile_size) for tx, ty in tiles_needed]
+    else:
+        tasks = []
+        for tx, ty in tiles_needed:
+            entry = batch_tiles[(zoom, tx, ty)]
+            if entry[0] is None:
+                entry[0] = asyncio.ensure_future(_get_tile(session, zoom, tx, ty, tile_size))
+            tasks.append(entry[0])
+    try:
+        tile_results = await asyncio.gather(*tasks, return_exceptions=True)
+    finally:
+        if batch_tiles is not None:
+            # Ostatni crop zwalnia kafelek - pamięć batcha nie rośnie z jego rozmiarem
+            for tx, ty in tiles_needed:
+                entry = batch_tiles[(zoom, tx, ty)]
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del batch_tiles[(zoom, tx, ty)]
+
+    # Żaden kafelek nie przyszedł: szary crop dałby tylko bezwartościową predykcję,
+    # więc kończymy przed preprocessingiem i inferencją (klient może ponowić później)
+    if all(isinstance(result, Exception) or result is None for result in tile_results):
+        raise RuntimeError("tiles unavailable")
+
+    # Crop składany bezpośrednio z przecięć kafelków (BGR, uint8) - bez pośredniej mozaiki
+    cropped = np.empty((size, size, 3), dtype=np.uint8)
+    for (tx, ty), result in zip(tiles_needed, tile_results):
+        x0 = max(left, tx * tile_size)
+        x1 = min(left + size, (tx + 1) * tile_size)
+        y0 = max(top, ty * tile_size)
+        y1 = min(top + size, (ty + 1) * tile_size)
+        crop_view = cropped[y0 - top:y1 - top, x0 - left:x1 - left]
+        if isinstance(result, Exception) or result is None:
+            crop_view[...] = 128
+        else:
+            crop_view[...] = result[
+                y0 - ty * tile_size:y1 - ty * tile_size,
+                x0 - tx * tile_size:x1 - tx * tile_size
+            ]
+
     return cropped
 
 
-async def _download_tile(session: aiohttp.ClientSession, url: str, i: int, j: int, tile_size: int):
-    """Helper function to download a single tile asynchronously."""
+async def _get_tile(
+    session: httpx.AsyncClient,
+    zoom: int,
+    tx: int,
+    ty: int,
+    tile_size: int
+) -> Optional[np.ndarray]:
+    """Return a decoded tile from TILE_CACHE, downloading it on a miss.
+
+    Concurrent requests for the same tile share a single download. Failed
+    downloads return None and are not cached, so they are retried next time.
+    """
+    key = (zoom, tx, ty)
+    tile = TILE_CACHE.get(key)
+    if tile is not None:
+        return tile
+
+    pending = _TILE_INFLIGHT.get(key)
+    if pending is not None:
+        # shield: anulowanie jednego z oczekujących nie może anulować wspólnego pobrania
+        return await asyncio.shield(pending)
+
+    future = asyncio.get_running_loop().create_future()
+    _TILE_INFLIGHT[key] = future
+    tile = None
+    try:
+        tile = await _load_tile(session, zoom, tx, ty, tile_size)
+        if tile is not None:
+            tile.flags.writeable = False  # współdzielony między żądaniami
+            TILE_CACHE[key] = tile
+        return tile
+    finally:
+        del _TILE_INFLIGHT[key]
+        future.set_result(tile)
+
+
+async def _load_tile(
+    session: httpx.AsyncClient,
+    zoom: int,
+    tx: int,
+    ty: int,
+    tile_size: int
+) -> Optional[np.ndarray]:
+    """Decoded tile from the disk cache, or downloaded (and persisted) on a miss; None if it failed."""
+    key = (zoom, tx, ty)
+    path = DISK_TILE_INDEX.get(key)
+    if path is not None:
+        try:
+            return _decode_tile(await asyncio.to_thread(_read_tile_file, path), tile_size)
+        except (OSError, ValueError):
+            DISK_TILE_INDEX.pop(key, None)  # plik usunięty lub uszkodzony - pobieramy ponownie
+
+    # Rozkładanie ruchu na serwery mt0..mt3 (osobne pule połączeń per host); stały URL
+    # (bez cache-bustera ts=) pozwala CDN i proxy serwować kafelek z cache
+    url = f"https://mt{(tx + ty) & 3}.google.com/vt/lyrs=s&x={tx}&y={ty}&z={zoom}"
+    content = await _download_tile(session, url)
+    if content is None:
+        return None
+    try:
+        tile = _decode_tile(content, tile_size)
+    except ValueError:
+        return None
+
+    if TILE_CACHE_DIR:
+        path = _disk_tile_path(zoom, tx, ty)
+        try:
+            await asyncio.to_thread(_write_tile_file, path, content)
+            DISK_TILE_INDEX[key] = path
+        except OSError as e:
+            logger.warning("Cannot write tile to disk cache %s: %s", path, e)
+        if DISK_TILE_INDEX.evicted:
+            evicted, DISK_TILE_INDEX.evicted = DISK_TILE_INDEX.evicted, []
+            await asyncio.to_thread(_remove_tile_files, evicted)
+    return tile
+
+
+async def _download_tile(session: httpx.AsyncClient, url: str) -> Optional[bytes]:
+    """Helper function to download the raw bytes of a single tile; None if it failed."""
     try:
-        async with session.get(url) as response:
-            response.raise_for_status()
-            content = await response.read()
-            tile_img = Image.open(BytesIO(content))
-            return (tile_img, i, j)
+        response = await session.get(url)
+        response.raise_for_status()
+        return response.content
     except Exception as e:
-        gray_tile = Image.new('RGB', (tile_size, tile_size), (128, 128, 128))
-        return (gray_tile, i, j)
+        return None
+
+
+def _decode_tile(content: bytes, tile_size: int) -> np.ndarray:
+    # Dekodowanie JPEG prosto do NumPy (libjpeg-turbo w cv2), wynik w BGR; kafelki nie mają
+    # orientacji EXIF, więc pomijamy jej parsowanie
+    # Pusta odpowiedź 200 lub pusty plik w cache: cv2.imdecode rzuciłby cv2.error
+    if not content:
+        raise ValueError("Empty tile content")
+    try:
+        tile_arr = cv2.imdecode(
+            np.frombuffer(content, dtype=np.uint8), cv2.IMREAD_COLOR | cv2.IMREAD_IGNORE_ORIENTATION
+        )
+    except cv2.error as e:
+        raise ValueError(f"Cannot decode tile image: {e}") from e
+    if tile_arr is None:
+        raise ValueError("Cannot decode tile image")
+    return _resize_if_needed(tile_arr, tile_size, tile_size)
+
+
+def _disk_tile_path(zoom: int, tx: int, ty: int) -> str:
+    return os.path.join(TILE_CACHE_DIR, str(zoom), f"{tx}_{ty}.jpg")
+
+
+def _read_tile_file(path: str) -> bytes:
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def _write_tile_file(path: str, content: bytes):
+    """Zapis atomowy: plik tymczasowy + os.replace, więc czytelnik nigdy nie widzi połowy kafelka."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+def _remove_tile_files(paths: List[str]):
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _load_disk_tile_index():
+    """Odtwarza indeks LRU z plików w TILE_CACHE_DIR (najstarsze wg mtime wypadają pierwsze)."""
+    entries = []
+    if os.path.isdir(TILE_CACHE_DIR):
+        for zoom_entry in os.scandir(TILE_CACHE_DIR):
+            if not (zoom_entry.is_dir() and zoom_entry.name.isdigit()):
+                continue
+            for entry in os.scandir(zoom_entry.path):
+                name, ext = os.path.splitext(entry.name)
+                if ext == '.tmp':  # pozostałość po przerwanym zapisie
+                    os.remove(entry.path)
+                    continue
+                tx, _, ty = name.partition('_')
+                if ext != '.jpg' or not (tx.lstrip('-').isdigit() and ty.lstrip('-').isdigit()):
+                    continue
+                entries.append((entry.stat().st_mtime, (int(zoom_entry.name), int(tx), int(ty)), entry.path))
+    for _, key, path in sorted(entries):
+        DISK_TILE_INDEX[key] = path
+    # Nadmiar ponad TILE_DISK_CACHE_SIZE (np. po zmniejszeniu limitu) - funkcja działa w wątku
+    _remove_tile_files(DISK_TILE_INDEX.evicted)
+    DISK_TILE_INDEX.evicted = []
+
+
+def _intra_op_thread_affinities(num_threads: int) -> str:
+    """Affinity string for ORT intra-op threads: one logical core per thread.
+
+    ORT expects num_threads - 1 entries (the calling thread is not pinned)
+    with 1-based logical processor ids.
+    """
+    return ";".join(str(core + 1) for core in ORT_CORES[1:num_threads])
+
+
+def _onnx_providers() -> List[str]:
+    """CUDA gdy dostępne w zainstalowanym onnxruntime, zawsze z CPU jako fallbackiem."""
+    if 'CUDAExecutionProvider' in ort.get_available_providers():
+        return ['CUDAExecutionProvider', 'CPUExecutionProvider']
+    return ['CPUExecutionProvider']
 
 
 # 3. NOWA FUNKCJA ŁADOWANIA SESJI ONNX
 def _load_onnx_session(path: str):
-    global MODEL
+    global MODEL, MODEL_BATCH_SIZE, MODEL_INPUT_NAME, MODEL_OUTPUT_NAME, MODEL_IO_BINDING, MODEL_OUTPUT_BUFFER
     session_path = path.replace('.pt', '.onnx')
 
     if not os.path.exists(session_path):
@@ -248,52 +679,231 @@ def _load_onnx_session(path: str):
         # Optymalizacja sesji ONNX
         sess_options = ort.SessionOptions()
         sess_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
-        sess_options.intra_op_num_threads = 4  # Dostosuj do liczby rdzeni CPU
-        
-        MODEL = ort.InferenceSession(
+        # Stały kształt wejścia CNN: arena + memory pattern pozwalają ORT reużywać alokacje
+        # między wywołaniami Run; sekwencyjne wykonanie grafu bez dodatkowych wątków inter-op
+        sess_options.enable_cpu_mem_arena = True
+        sess_options.enable_mem_pattern = True
+        sess_options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        intra_op_threads = ORT_NUM_THREADS
+        sess_options.intra_op_num_threads = intra_op_threads
+        sess_options.inter_op_num_threads = 1
+        # Odpowiednik OMP_WAIT_POLICY=PASSIVE dla puli wątków ORT (buildy bez OpenMP)
+        sess_options.add_session_config_entry("session.intra_op.allow_spinning", "0")
+        if ORT_PIN_THREADS and intra_op_threads > 1:
+            sess_options.add_session_config_entry(
+                "session.intra_op_thread_affinities",
+                _intra_op_thread_affinities(intra_op_threads)
+            )
+
+        session = ort.InferenceSession(
             session_path,
             sess_options=sess_options,
-            providers=['CPUExecutionProvider']  # Można dodać 'CUDAExecutionProvider' dla GPU
+            providers=_onnx_providers()
         )
-        return MODEL
+        if ORT_FIXED_BATCH:
+            # Symboliczne wymiary wejścia -> batch MAX_INFERENCE_BATCH_SIZE, reszta z MODEL_META;
+            # sesja budowana ponownie, bo override działa tylko przy tworzeniu
+            fixed_shape = (MAX_INFERENCE_BATCH_SIZE, *MODEL_META['input_shape'])
+            overrides = {
+                dim: size for dim, size in zip(session.get_inputs()[0].shape, fixed_shape)
+                if isinstance(dim, str)
+            }
+            if overrides:
+                for dim_name, size in overrides.items():
+                    sess_options.add_free_dimension_override_by_name(dim_name, size)
+                session = ort.InferenceSession(
+                    session_path,
+                    sess_options=sess_options,
+                    providers=_onnx_providers()
+                )
     except Exception as e:
         raise RuntimeError(f'Błąd ładowania sesji ONNX: {e}')
 
+    # Wszystko liczone lokalnie - globalne zmienne ustawiamy dopiero, gdy sesja przeszła
+    # wszystkie sprawdzenia, więc nieudane ładowanie nie zostawia półgotowego MODEL
+    batch_dim = session.get_inputs()[0].shape[0]
+    batch_size = batch_dim if isinstance(batch_dim, int) else None
+    if batch_size is not None and batch_size != MAX_INFERENCE_BATCH_SIZE:
+        raise RuntimeError(
+            f'Model ma stały batch {batch_dim}, oczekiwano {MAX_INFERENCE_BATCH_SIZE} (MAX_INFERENCE_BATCH_SIZE)'
+        )
+    output_shape = session.get_outputs()[0].shape
+    if len(output_shape) == 2 and isinstance(output_shape[1], int):
+        output_buffer = np.empty((MAX_INFERENCE_BATCH_SIZE, output_shape[1]), dtype=np.float32)
+    else:
+        output_buffer = None  # Nieznana liczba klas - wyjście alokuje ORT
+    input_name = session.get_inputs()[0].name
+    output_name = session.get_outputs()[0].name
+    io_binding = session.io_binding()
+
+    MODEL_BATCH_SIZE = batch_size
+    MODEL_INPUT_NAME = input_name
+    MODEL_OUTPUT_NAME = output_name
+    MODEL_IO_BINDING = io_binding
+    MODEL_OUTPUT_BUFFER = output_buffer
+    MODEL = session
+    return MODEL
+
+
+def _warmup_model(model: ort.InferenceSession):
+    """Run dummy inferences so the first real request hits a warm session.
+
+    The first Run triggers graph partitioning and kernel selection; warm up
+    every batch size the API actually uses (single /predict and full batches).
+    """
+    batch_sizes = (MODEL_BATCH_SIZE,) if MODEL_BATCH_SIZE is not None else (1, MAX_INFERENCE_BATCH_SIZE)
+    for batch_size in batch_sizes:
+        dummy = np.zeros((batch_size, *MODEL_META['input_shape']), dtype=np.float32)
+        warmup_start = time.time()
+        try:
+            model.run(None, {MODEL_INPUT_NAME: dummy})
+        except Exception as e:
+            logger.warning("Model warm-up with batch size %d failed: %s", batch_size, e)
+            continue
+        logger.info("Model warmed up with batch size %d in %.3fs", batch_size, time.time() - warmup_start)
+
+
+def _cpu_supports_vnni() -> bool:
+    """Czy CPU ma instrukcje VNNI (AVX512-VNNI / AVX-VNNI) dla iloczynów int8.
+
+    Bez VNNI model int8 nie jest szybszy od fp32, więc zostajemy przy fp32.
+    """
+    try:
+        with open('/proc/cpuinfo') as f:
+            cpuinfo = f.read()
+    except OSError:
+        return False
+    return 'avx512_vnni' in cpuinfo or 'avx_vnni' in cpuinfo
+
 
 def get_model():
     global MODEL
     if MODEL is not None:
         return MODEL
-    # Użycie ścieżki do pliku .onnx
-    onnx_file = os.path.join(os.path.dirname(__file__), '..', 'artifacts', 'asbestos_net.onnx')
-    onnx_file = os.path.normpath(onnx_file)
+    # Użycie ścieżki do pliku .onnx; wariant int8 (api/quantize_model.py) wg MODEL_PRECISION
+    artifacts_dir = os.path.normpath(os.path.join(os.path.dirname(__file__), '..', 'artifacts'))
+    onnx_file = os.path.join(artifacts_dir, 'asbestos_net.onnx')
+    int8_file = os.path.join(artifacts_dir, 'asbestos_net_int8.onnx')
+    if MODEL_PRECISION != 'fp32' and os.path.exists(int8_file):
+        if MODEL_PRECISION == 'int8' or _cpu_supports_vnni():
+            onnx_file = int8_file
+    logger.info("Loading ONNX model: %s", os.path.basename(onnx_file))
     return _load_onnx_session(onnx_file)
 
 
-def _prepare_image_for_model(pil_img: Image.Image):
-    """Zoptymalizowana funkcja preprocessingowa używająca NumPy."""
-    meta = MODEL_META
-    
-    input_shape = tuple(meta.get('input_shape'))
-    _, H, W = input_shape
-    
-    # Resize jeśli potrzebne
-    if pil_img.size != (W, H):
-        pil_img = pil_img.resize((W, H), Image.BILINEAR)
-    
-    # Konwersja bezpośrednio do NumPy (szybsze niż przez PyTorch)
-    img_array = np.array(pil_img, dtype=np.float32) / 255.0  # [H, W, C]
-    
-    # Transpozycja do [C, H, W]
-    img_array = np.transpose(img_array, (2, 0, 1))
-    
-    # Normalizacja używając prekalkulowanych wartości
-    img_array = (img_array - MEAN_NP) / STD_NP
-    
-    # Dodanie wymiaru batcha: [1, C, H, W]
-    img_array = np.expand_dims(img_array, axis=0)
-    
-    return img_array
+def _resize_if_needed(img_array: np.ndarray, height: int, width: int) -> np.ndarray:
+    """Resize z cv2 (SIMD) tylko gdy rozmiar się różni - w typowej ścieżce to no-op.
+
+    INTER_AREA przy zmniejszaniu (antyaliasing jak w PIL), INTER_LINEAR przy powiększaniu.
+    """
+    if img_array.shape[:2] == (height, width):
+        return img_array
+    shrinking = img_array.shape[0] > height or img_array.shape[1] > width
+    interpolation = cv2.INTER_AREA if shrinking else cv2.INTER_LINEAR
+    return cv2.resize(img_array, (width, height), interpolation=interpolation)
+
+
+def _prepare_image_for_model(img_array: np.ndarray) -> np.ndarray:
+    """Preprocessing pojedynczego obrazu tą samą ścieżką co batche w API (jądro Numba).
+
+    `img_array` to obraz BGR uint8 [H, W, 3], tak jak zwraca download_satellite_image.
+    Zwraca ciągłą tablicę float32 [1, C, H, W], którą można podać wprost do ORT.
+    """
+    _, H, W = MODEL_META['input_shape']
+    staging = np.empty((1, H, W, 3), dtype=np.uint8)
+    out = np.empty((1, *MODEL_META['input_shape']), dtype=np.float32)
+    error = _prepare_batch_for_model([img_array], staging, out)[0]
+    if error is not None:
+        raise error
+    return out
+
+
+# Warstwa wątków workqueue Numby nie dopuszcza równoległych wywołań jądra z wielu wątków.
+# W API woła je tylko jedyny wątek PREP_EXECUTOR; lock chroni inne wywołania
+# (np. kalibrację w api/quantize_model.py)
+_NORMALIZE_KERNEL_LOCK = threading.Lock()
+
+
+@njit(parallel=True, fastmath=True, cache=True)
+def _normalize_batch_kernel(images, lut, out):
+    """Fused LUT-normalize + HWC->CHW + BGR->RGB: uint8 [B, H, W, 3] -> float32 [B, 3, H, W]."""
+    for b in prange(images.shape[0]):
+        for y in range(images.shape[1]):
+            for x in range(images.shape[2]):
+                out[b, 0, y, x] = lut[0, images[b, y, x, 2]]
+                out[b, 1, y, x] = lut[1, images[b, y, x, 1]]
+                out[b, 2, y, x] = lut[2, images[b, y, x, 0]]
+
+
+def _prepare_batch_for_model(
+    images: List[np.ndarray],
+    staging: np.ndarray,
+    out: np.ndarray
+) -> List[Optional[Exception]]:
+    """Preprocessing całego batcha jednym wywołaniem jądra Numba.
+
+    Wycinki BGR uint8 (po ewentualnym resize) są kopiowane do `staging` [B, H, W, 3],
+    a wynik trafia do `out` [B, C, H, W]. Zwraca wyjątek dla każdego obrazu, którego
+    nie dało się przygotować (jego wiersz w `out` jest wtedy bez znaczenia).
+    """
+    _, H, W = MODEL_META['input_shape']
+    errors: List[Optional[Exception]] = [None] * len(images)
+    for k, img in enumerate(images):
+        try:
+            staging[k] = _resize_if_needed(img, H, W)
+        except Exception as e:
+            errors[k] = e
+
+    with _NORMALIZE_KERNEL_LOCK:
+        _normalize_batch_kernel(staging[:len(images)], NORM_LUT, out[:len(images)])
+    return errors
+
+
+def _run_with_iobinding(model: ort.InferenceSession, batch_input: np.ndarray) -> np.ndarray:
+    """model.run przez IOBinding; zwraca P(azbest) dla każdego wiersza batcha.
+
+    ORT czyta wejście bezpośrednio z bufora batcha (`batch_input`, ciągły float32, np.
+    batch_buffer[:n]) i zapisuje logity do MODEL_OUTPUT_BUFFER - bez alokacji po żadnej
+    stronie. Binding i bufor wyjścia są współdzielone, więc wywołujemy tylko z
+    INFERENCE_EXECUTOR (jeden wątek).
+    """
+    io_binding = MODEL_IO_BINDING
+    io_binding.bind_input(
+        name=MODEL_INPUT_NAME,
+        device_type='cpu',
+        device_id=0,
+        element_type=np.float32,
+        shape=batch_input.shape,
+        buffer_ptr=batch_input.ctypes.data
+    )
+    if MODEL_OUTPUT_BUFFER is not None:
+        logits = MODEL_OUTPUT_BUFFER[:len(batch_input)]
+        io_binding.bind_output(
+            name=MODEL_OUTPUT_NAME,
+            device_type='cpu',
+            device_id=0,
+            element_type=np.float32,
+            shape=logits.shape,
+            buffer_ptr=logits.ctypes.data
+        )
+        model.run_with_iobinding(io_binding)
+    else:
+        io_binding.bind_output(MODEL_OUTPUT_NAME, 'cpu')
+        model.run_with_iobinding(io_binding)
+        logits = io_binding.copy_outputs_to_cpu()[0]
+    # Post-processing jeszcze w tym wątku - następny batch nadpisze bufor logitów
+    return _logits_to_probabilities(logits)
+
+
+def _logits_to_probabilities(logits: np.ndarray) -> np.ndarray:
+    """Wektorowy post-processing: P(azbest) dla każdego wiersza batcha logitów [B, C]."""
+    if logits.ndim == 2 and logits.shape[1] > 1:
+        # Softmax
+        exp_logits = np.exp(logits - logits.max(axis=1, keepdims=True))
+        exp_logits /= exp_logits.sum(axis=1, keepdims=True)
+        return exp_logits[:, 1]
+    # Sigmoid
+    return 1.0 / (1.0 + np.exp(-logits.reshape(logits.shape[0], -1)[:, 0]))
 
 
 # ====================================================================
@@ -319,12 +929,22 @@ async def health():
     return {"status": "ok"}
 
 
-@app.post("/predict")
-async def predict(req: PredictRequest):
+@app.post(
+    "/predict",
+    openapi_extra={"requestBody": _openapi_json_body(PredictRequest)},
+    responses={200: {"description": "Successful Response", "content": {
+        "application/json": {"schema": _openapi_schema(PredictResponse)}
+    }}},
+)
+async def predict(request: Request) -> Response:
     start_time = time.time()
-    print(f"\n{'='*60}")
-    print(f"📍 SINGLE PREDICTION: lat={req.centroidLat:.6f}, lng={req.centroidLng:.6f}")
-    
+    try:
+        req = PREDICT_REQUEST_DECODER.decode(await request.body())
+    except msgspec.ValidationError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except msgspec.DecodeError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid JSON body: {e}")
+
     try:
         model = get_model()
     except FileNotFoundError as e:
@@ -335,61 +955,49 @@ async def predict(req: PredictRequest):
     # download image around centroid
     download_start = time.time()
     try:
-        pil_img = await download_satellite_image(req.centroidLat, req.centroidLng, size=IMG_SIZE, zoom=ZOOM)
+        img_array = await download_satellite_image(req.centroidLat, req.centroidLng, size=IMG_SIZE, zoom=ZOOM)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to download image: {e}")
     download_time = time.time() - download_start
-    print(f"  ⬇️  Download: {download_time:.3f}s")
-
-    # prepare tensor
-    prep_start = time.time()
-    try:    
-        input_np = _prepare_image_for_model(pil_img)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to prepare image: {e}")
-    prep_time = time.time() - prep_start
-    print(f"  🔧 Preprocessing: {prep_time:.3f}s")
 
-    # inference
+    # preprocessing + inference - przez micro-batching razem z równoległymi żądaniami /predict
     inference_start = time.time()
+    future = asyncio.get_running_loop().create_future()
+    PREDICT_QUEUE.put_nowait((model, img_array, future))
     try:
-        input_name = model.get_inputs()[0].name
-        ort_outs = model.run(None, {input_name: input_np})
-        logits = ort_outs[0]
-
-        if logits.ndim == 2 and logits.shape[1] > 1:
-            exp_logits = np.exp(logits - np.max(logits, axis=1, keepdims=True))
-            probs = exp_logits / np.sum(exp_logits, axis=1, keepdims=True)
-            prob_asbestos = float(probs[0, 1] if probs.shape[1] > 1 else probs[0, -1])
-        else:
-            prob_asbestos = float(1.0 / (1.0 + np.exp(-logits.flatten()[0])))
-
+        result = await future
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Model inference error (ONNX): {e}")
-    
+    if isinstance(result, Exception):
+        raise HTTPException(status_code=500, detail=f"Failed to prepare image: {result}")
+    prob_asbestos = float(result)
     inference_time = time.time() - inference_start
     total_time = time.time() - start_time
-    
-    print(f"  🧠 Inference: {inference_time:.3f}s")
-    print(f"  ✅ TOTAL: {total_time:.3f}s | Result: {prob_asbestos:.4f}")
-    print(f"{'='*60}\n")
 
-    return {"isPotentiallyAsbestos": prob_asbestos}
+    logger.info(
+        "Single prediction lat=%.6f lng=%.6f: download %.3fs, prep+inference %.3fs, total %.3fs | result %.4f",
+        req.centroidLat, req.centroidLng, download_time, inference_time, total_time, prob_asbestos,
+    )
+
+    return MsgspecJSONResponse(PredictResponse(isPotentiallyAsbestos=prob_asbestos))
 
 
-async def _download_and_prepare_image(lat: float, lng: float, idx: int) -> np.ndarray:
-    """Download and prepare a single image for inference."""
+async def _download_image(lat: float, lng: float, tile_position=None, batch_tiles=None) -> np.ndarray:
+    """Download a single image (I/O only - preprocessing runs on PREP_EXECUTOR)."""
     async with SEMAPHORE:
-        pil_img = await download_satellite_image(lat, lng, size=IMG_SIZE, zoom=ZOOM)
-        input_np = _prepare_image_for_model(pil_img)
-        return input_np
+        return await download_satellite_image(
+            lat, lng, size=IMG_SIZE, zoom=ZOOM, tile_position=tile_position, batch_tiles=batch_tiles
+        )
 
 
-async def _batch_inference(model: ort.InferenceSession, images: List[np.ndarray]) -> List[float]:
-    """Run batched ONNX inference with parallel batch processing."""
+async def _batch_inference(
+    model: ort.InferenceSession,
+    images: List[np.ndarray]
+) -> List[Union[float, Exception]]:
+    """Preprocess images into pooled batch buffers and run batched ONNX inference.
 
-    # Get input name once
-    input_name = model.get_inputs()[0].name
+    Returns one probability per image, or the exception raised while preparing it.
+    """
 
     # Split into batches
     batches = []
@@ -397,39 +1005,40 @@ async def _batch_inference(model: ort.InferenceSession, images: List[np.ndarray]
         batch = images[i:i + MAX_INFERENCE_BATCH_SIZE]
         batches.append(batch)
 
-    print(f"  - Split into {len(batches)} batches of max {MAX_INFERENCE_BATCH_SIZE} images")
+    logger.debug("Split into %d batches of max %d images", len(batches), MAX_INFERENCE_BATCH_SIZE)
 
     # Process all batches in parallel
-    loop = asyncio.get_event_loop()
+    loop = asyncio.get_running_loop()
 
-    async def process_batch(batch_idx: int, batch: List[np.ndarray]) -> List[float]:
+    async def process_batch(batch_idx: int, batch: List[np.ndarray]) -> List[Union[float, Exception]]:
         """Process a single batch and return predictions."""
-        # Stack images into batch: [batch_size, 3, 128, 128]
-        batch_input = np.concatenate(batch, axis=0)
-
-        # Run inference in thread pool (CPU-bound operation)
-        logits = await loop.run_in_executor(
-            INFERENCE_EXECUTOR,
-            lambda bi=batch_input: model.run(None, {input_name: bi})[0]
-        )
-
-        # Post-process batch results
-        predictions = []
-        for j in range(len(batch)):
-            logit = logits[j:j+1]
-
-            if logit.ndim == 2 and logit.shape[1] > 1:
-                # Softmax
-                exp_logits = np.exp(logit - np.max(logit, axis=1, keepdims=True))
-                probs = exp_logits / np.sum(exp_logits, axis=1, keepdims=True)
-                prob_asbestos = float(probs[0, 1] if probs.shape[1] > 1 else probs[0, -1])
+        staging, batch_buffer = await BATCH_BUFFERS.get()
+        try:
+            # Contiguous view [batch_size, 3, 128, 128] filled by one kernel call
+            batch_input = batch_buffer[:len(batch)]
+            if MODEL_BATCH_SIZE is not None:
+                # Fixed-batch model: run the whole buffer with a zeroed tail, slice logits below
+                batch_buffer[len(batch):] = 0
+                run_input = batch_buffer
             else:
-                # Sigmoid
-                prob_asbestos = float(1.0 / (1.0 + np.exp(-logit.flatten()[0])))
-
-            predictions.append(prob_asbestos)
-
-        return predictions
+                run_input = batch_input
+            prep_errors = await loop.run_in_executor(
+                PREP_EXECUTOR, _prepare_batch_for_model, batch, staging, batch_buffer
+            )
+
+            # Run inference in thread pool (CPU-bound operation)
+            probabilities = await loop.run_in_executor(
+                INFERENCE_EXECUTOR, _run_with_iobinding, model, run_input
+            )
+        finally:
+            BATCH_BUFFERS.put_nowait((staging, batch_buffer))
+
+        # Probabilities were computed for the whole batch in one vectorized pass
+        predictions = probabilities[:len(batch)].astype(np.float64).tolist()
+        return [
+            error if error is not None else prediction
+            for error, prediction in zip(prep_errors, predictions)
+        ]
 
     # Run all batches in parallel
     batch_tasks = [process_batch(i, batch) for i, batch in enumerate(batches)]
@@ -441,19 +1050,73 @@ async def _batch_inference(model: ort.InferenceSession, images: List[np.ndarray]
     return all_predictions
 
 
-@app.post("/batch_predict")
-async def batch_predict(req: BatchPredictRequest) -> BatchPredictResponse:
+async def _predict_batch_worker():
+    """Micro-batching for /predict: coalesce concurrent requests into one inference batch.
+
+    Waits for the first queued image, then collects more for up to MICRO_BATCH_WAIT_MS
+    (or until MICRO_BATCH_SIZE) and hands the batch off without waiting for it,
+    so the next batch is collected while this one is preprocessed and inferred.
+    """
+    loop = asyncio.get_running_loop()
+    running = set()
+    while True:
+        items = [await PREDICT_QUEUE.get()]
+        deadline = loop.time() + MICRO_BATCH_WAIT_MS / 1000.0
+        while len(items) < MICRO_BATCH_SIZE:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                items.append(await asyncio.wait_for(PREDICT_QUEUE.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        task = asyncio.create_task(_run_predict_batch(items))
+        running.add(task)
+        task.add_done_callback(running.discard)
+
+
+async def _run_predict_batch(items: List[Tuple[ort.InferenceSession, np.ndarray, asyncio.Future]]):
+    """Run one coalesced /predict batch and resolve each caller's future.
+
+    A preprocessing failure is delivered as the future's result (an Exception object),
+    an inference failure as the future's exception - /predict reports them differently.
+    """
+    model = items[0][0]  # sesja wczytana w /predict przed dodaniem do kolejki
+    try:
+        results = await _batch_inference(model, [img for _, img, _ in items])
+    except Exception as e:
+        for _, _, future in items:
+            if not future.done():
+                future.set_exception(e)
+        return
+    for (_, _, future), result in zip(items, results):
+        if not future.done():  # caller may have gone away (cancelled)
+            future.set_result(result)
+
+
+@app.post(
+    "/batch_predict",
+    openapi_extra={"requestBody": _openapi_json_body(BatchPredictRequest)},
+    responses={200: {"description": "Successful Response", "content": {
+        "application/json": {"schema": _openapi_schema(BatchPredictResponse)}
+    }}},
+)
+async def batch_predict(request: Request) -> Response:
     """Predict asbestos for multiple coordinates using optimized batched inference."""
 
     batch_start_time = time.time()
+    try:
+        req = BATCH_REQUEST_DECODER.decode(await request.body())
+    except msgspec.ValidationError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except msgspec.DecodeError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid JSON body: {e}")
     batch_size = len(req.coordinates)
 
-    print(f"\n{'='*80}")
-    print(f"🚀 BATCH PREDICTION START (OPTIMIZED)")
-    print(f"{'='*80}")
-    print(f"📊 Batch size: {batch_size} coordinates")
-    print(f"⚡ Max concurrent downloads: {MAX_CONCURRENT_REQUESTS}")
-    print(f"🧠 Inference batch size: {MAX_INFERENCE_BATCH_SIZE}")
+    logger.info(
+        "Batch prediction start: %d coordinates (max concurrent downloads: %d, inference batch size: %d)",
+        batch_size, MAX_CONCURRENT_REQUESTS, MAX_INFERENCE_BATCH_SIZE,
+    )
 
     if not req.coordinates:
         raise HTTPException(status_code=400, detail="Coordinates list cannot be empty")
@@ -465,165 +1128,116 @@ async def batch_predict(req: BatchPredictRequest) -> BatchPredictResponse:
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Model load error: {e}")
 
-    # PHASE 1: Download all images in parallel
-    print(f"\n📥 PHASE 1: Downloading {batch_size} satellite images...")
-    download_start = time.time()
-
-    download_tasks = [
-        _download_and_prepare_image(coord.centroidLat, coord.centroidLng, idx)
-        for idx, coord in enumerate(req.coordinates)
+    # PIPELINE: downloads feed a queue; every full batch is sent to inference while
+    # the remaining downloads continue, so network and CPU work overlap
+    logger.debug("Pipeline: downloading %d satellite images, inference in batches of %d", batch_size, MAX_INFERENCE_BATCH_SIZE)
+    pipeline_start = time.time()
+    download_time = 0.0
+
+    # Wyniki kolumnowo (po jednej liście na pole), indeksowane pozycją współrzędnej
+    probabilities: List[float] = [0.0] * batch_size
+    errors: List[Optional[str]] = [None] * batch_size
+    ready: asyncio.Queue = asyncio.Queue(maxsize=2 * MAX_INFERENCE_BATCH_SIZE)
+
+    # Pozycje kafelków dla wszystkich współrzędnych jednym wektorowym przebiegiem
+    tile_positions = lat_lng_to_pixel_in_tile_batch(
+        np.fromiter((coord.centroidLat for coord in req.coordinates), dtype=np.float64, count=batch_size),
+        np.fromiter((coord.centroidLng for coord in req.coordinates), dtype=np.float64, count=batch_size),
+        ZOOM,
+    ).tolist()
+    # Kafelki wspólne dla sąsiednich budynków pobierane raz na cały batch
+    batch_tiles = _plan_batch_tiles(tile_positions, IMG_SIZE, ZOOM)
+    logger.debug("%d coordinates need %d unique tiles", batch_size, len(batch_tiles))
+
+    async def download(idx: int, coord: CoordinateItem) -> Tuple[int, Union[np.ndarray, Exception]]:
+        try:
+            return idx, await _download_image(
+                coord.centroidLat, coord.centroidLng, tile_positions[idx], batch_tiles
+            )
+        except Exception as e:
+            return idx, e
+
+    async def produce():
+        nonlocal download_time
+        async with asyncio.TaskGroup() as tg:
+            download_tasks = [tg.create_task(download(idx, coord)) for idx, coord in enumerate(req.coordinates)]
+            # Each finished download goes downstream immediately, no list of all results
+            for next_done in asyncio.as_completed(download_tasks):
+                idx, result = await next_done
+                if isinstance(result, Exception):
+                    errors[idx] = str(result)
+                    if logger.isEnabledFor(logging.DEBUG):
+                        logger.debug("[%d] Download failed: %.80s", idx, result)
+                else:
+                    await ready.put((idx, result))
+        download_time = time.time() - pipeline_start
+        await ready.put(None)  # Sentinel: all downloads finished
+
+    async def infer(indices: List[int], images: List[np.ndarray]):
+        # Preprocessing (PREP_EXECUTOR, into pooled batch buffers) + batched ONNX inference
+        batch_predictions = await _batch_inference(model, images)
+        for idx, result in zip(indices, batch_predictions):
+            if isinstance(result, Exception):
+                errors[idx] = f"Failed to prepare image: {result}"
+            else:
+                probabilities[idx] = result
+
+    async def consume():
+        indices: List[int] = []
+        images: List[np.ndarray] = []
+        async with asyncio.TaskGroup() as tg:
+            while True:
+                item = await ready.get()
+                if item is not None:
+                    indices.append(item[0])
+                    images.append(item[1])
+                if len(images) == MAX_INFERENCE_BATCH_SIZE or (item is None and images):
+                    tg.create_task(infer(indices, images))
+                    indices, images = [], []
+                if item is None:
+                    break
+
+    async with asyncio.TaskGroup() as tg:
+        tg.create_task(produce())
+        tg.create_task(consume())
+    pipeline_time = time.time() - pipeline_start
+    failed = batch_size - errors.count(None)
+    successful = batch_size - failed
+    logger.debug("Completed %d predictions in %.3fs", successful, pipeline_time)
+
+    # PHASE 3: Build results in one pass over the columns (Struct init does no validation)
+    final_results = [
+        PredictionResult(
+            centroidLat=coord.centroidLat,
+            centroidLng=coord.centroidLng,
+            id=coord.id,
+            isPotentiallyAsbestos=probability,
+            success=error is None,
+            error=error
+        )
+        for coord, probability, error in zip(req.coordinates, probabilities, errors)
     ]
-    download_results = await asyncio.gather(*download_tasks, return_exceptions=True)
-    download_time = time.time() - download_start
-
-    # Separate successful downloads from errors
-    prepared_images = []
-    image_indices = []
-    error_results = {}
-
-    for idx, result in enumerate(download_results):
-        if isinstance(result, Exception):
-            error_results[idx] = str(result)
-            print(f"❌ [{idx}] Download failed: {str(result)[:80]}")
-        else:
-            prepared_images.append(result)
-            image_indices.append(idx)
-
-    print(f"✓ Downloaded {len(prepared_images)}/{batch_size} images in {download_time:.3f}s")
-
-    # PHASE 2: Batch ONNX inference
-    print(f"\n🧠 PHASE 2: Running batched ONNX inference...")
-    inference_start = time.time()
-
-    predictions = await _batch_inference(model, prepared_images)
-
-    inference_time = time.time() - inference_start
-    print(f"✓ Completed {len(predictions)} predictions in {inference_time:.3f}s")
-    print(f"  - Average inference time: {inference_time / len(predictions):.4f}s per image")
-
-    # PHASE 3: Build results
-    final_results = []
-    for idx, coord in enumerate(req.coordinates):
-        if idx in error_results:
-            # Image download failed
-            final_results.append(PredictionResult(
-                centroidLat=coord.centroidLat,
-                centroidLng=coord.centroidLng,
-                id=coord.id,
-                isPotentiallyAsbestos=0.0,
-                success=False,
-                error=error_results[idx]
-            ))
-        else:
-            # Find prediction result
-            result_idx = image_indices.index(idx)
-            final_results.append(PredictionResult(
-                centroidLat=coord.centroidLat,
-                centroidLng=coord.centroidLng,
-                id=coord.id,
-                isPotentiallyAsbestos=predictions[result_idx],
-                success=True,
-                error=None
-            ))
-
-    successful = sum(1 for r in final_results if r.success)
-    failed = len(final_results) - successful
     total_batch_time = time.time() - batch_start_time
 
-    print(f"\n{'='*80}")
-    print(f"✅ BATCH PREDICTION COMPLETE")
-    print(f"{'='*80}")
-    print(f"✅ Successful: {successful}/{batch_size} ({successful/batch_size*100:.1f}%)")
-    print(f"❌ Failed: {failed}/{batch_size} ({failed/batch_size*100:.1f}%)")
-    print(f"⏱️  Download time: {download_time:.3f}s")
-    print(f"⏱️  Inference time: {inference_time:.3f}s")
-    print(f"⏱️  TOTAL TIME: {total_batch_time:.3f}s")
-    print(f"🚀 THROUGHPUT: {successful / total_batch_time:.2f} predictions/second")
-    print(f"{'='*80}\n")
-
-    return BatchPredictResponse(
+    logger.info(
+        "Batch prediction complete: %d/%d successful, %d failed | downloads %.3fs, download+inference pipeline %.3fs, total %.3fs (%.2f predictions/s)",
+        successful, batch_size, failed, download_time, pipeline_time, total_batch_time,
+        successful / total_batch_time,
+    )
+
+    response = BatchPredictResponse(
         results=final_results,
         total=len(final_results),
         successful=successful,
         failed=failed
     )
-
-
-async def _predict_single_coordinate_with_semaphore(
-    lat: float, 
-    lng: float, 
-    coord_id: Optional[str] = None,
-    idx: int = 0
-) -> PredictionResult:
-    """Wrapper with semaphore for rate limiting."""
-    async with SEMAPHORE:
-        start_time = time.time()
-        
-        result = await _predict_single_coordinate_async(lat, lng, coord_id)
-        
-        elapsed = time.time() - start_time
-        status_emoji = "✅" if result.success else "❌"
-        print(f"{status_emoji} [{idx:4d}] {elapsed:.3f}s | prob={result.isPotentiallyAsbestos:.4f} | lat={lat:.6f}, lng={lng:.6f}")
-        
-        return result
-
-
-async def _predict_single_coordinate_async(lat: float, lng: float, coord_id: Optional[str] = None) -> PredictionResult:
-    """Asynchroniczna pomocnicza funkcja do przewidywania dla pojedynczej współrzędnej."""
-    try:
-        # Download image (async)
-        pil_img = await download_satellite_image(lat, lng, size=IMG_SIZE, zoom=ZOOM)
-        
-        # Prepare tensor
-        input_np = _prepare_image_for_model(pil_img)
-        
-        # Get model
-        model = get_model()
-        
-        # Inference
-        input_name = model.get_inputs()[0].name
-        ort_outs = model.run(None, {input_name: input_np})
-        logits = ort_outs[0]
-        
-        # Post-processing
-        if logits.ndim == 2 and logits.shape[1] > 1:
-            exp_logits = np.exp(logits - np.max(logits, axis=1, keepdims=True))
-            probs = exp_logits / np.sum(exp_logits, axis=1, keepdims=True)
-            prob_asbestos = float(probs[0, 1] if probs.shape[1] > 1 else probs[0, -1])
-        else:
-            prob_asbestos = float(1.0 / (1.0 + np.exp(-logits.flatten()[0])))
-        
-        return PredictionResult(
-            centroidLat=lat,
-            centroidLng=lng,
-            id=coord_id,
-            isPotentiallyAsbestos=prob_asbestos,
-            success=True,
-            error=None
-        )
-    
-    except Exception as e:
-        return PredictionResult(
-            centroidLat=lat,
-            centroidLng=lng,
-            id=coord_id,
-            isPotentiallyAsbestos=0.0,
-            success=False,
-            error=str(e)
-        )
-
-
-# Zachowanie starej synchronicznej funkcji dla kompatybilności
-def _predict_single_coordinate(lat: float, lng: float, coord_id: Optional[str] = None) -> PredictionResult:
-    """Synchroniczna wersja - uruchom async w nowym event loop."""
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    try:
-        return loop.run_until_complete(_predict_single_coordinate_async(lat, lng, coord_id))
-    finally:
-        loop.close()
+    return MsgspecJSONResponse(response)
 
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    # uvloop + httptools (z uvicorn[standard]); uvloop nie działa na Windows
+    if sys.platform == 'win32':
+        uvicorn.run(app, host="0.0.0.0", port=8000)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=8000, loop="uvloop", http="httptools")
\ No newline at end of file
@@ -0,0 +1,100 @@
+"""Jednorazowy krok budowania: kwantyzacja modelu ONNX do int8 (statyczna, QDQ).
+
+Na CPU z VNNI (AVX512-VNNI / AVX-VNNI) jądra int8 ORT są wyraźnie szybsze od fp32,
+a wagi zajmują 4x mniej pamięci. Kalibracja aktywacji odbywa się na przykładowych
+kafelkach przepuszczonych przez ten sam preprocessing co w API.
+
+Wymaga pakietów onnx (import onnxruntime.quantization) i sympy (symboliczna inferencja
+kształtów w quant_pre_process), których nie ma w obrazie API:
+    pip install -r api/requirements-tools.txt
+
+Użycie (z katalogu głównego repo):
+    python -m api.quantize_model
+    python -m api.quantize_model --calibration-dir MapParser/building_images_labeled --samples 200
+"""
+import argparse
+import glob
+import os
+import tempfile
+from typing import Dict, List, Optional
+
+import cv2
+import numpy as np
+import onnxruntime as ort
+from onnxruntime.quantization import (
+    CalibrationDataReader,
+    QuantFormat,
+    QuantType,
+    quantize_static,
+)
+from onnxruntime.quantization.shape_inference import quant_pre_process
+
+from api.main import _prepare_image_for_model
+
+REPO_ROOT = os.path.normpath(os.path.join(os.path.dirname(__file__), '..'))
+DEFAULT_MODEL = os.path.join(REPO_ROOT, 'artifacts', 'asbestos_net.onnx')
+DEFAULT_OUTPUT = os.path.join(REPO_ROOT, 'artifacts', 'asbestos_net_int8.onnx')
+DEFAULT_CALIBRATION_DIR = os.path.join(REPO_ROOT, 'MapParser', 'building_images_labeled')
+DEFAULT_SAMPLES = 200
+
+
+class TileCalibrationReader(CalibrationDataReader):
+    """Podaje kwantyzatorowi kafelki z dysku, po jednym, już znormalizowane."""
+
+    def __init__(self, input_name: str, image_paths: List[str]):
+        self.input_name = input_name
+        self.image_paths = iter(image_paths)
+
+    def get_next(self) -> Optional[Dict[str, np.ndarray]]:
+        for path in self.image_paths:
+            img = cv2.imread(path, cv2.IMREAD_COLOR)  # BGR, jak w download_satellite_image
+            if img is None:
+                continue
+            return {self.input_name: _prepare_image_for_model(img)}
+        return None
+
+
+def _collect_images(calibration_dir: str, samples: int) -> List[str]:
+    paths: List[str] = []
+    for pattern in ('*.png', '*.jpg', '*.jpeg'):
+        paths.extend(glob.glob(os.path.join(calibration_dir, '**', pattern), recursive=True))
+    return sorted(paths)[:samples]
+
+
+def quantize(model_path: str, output_path: str, calibration_dir: str, samples: int):
+    image_paths = _collect_images(calibration_dir, samples)
+    if not image_paths:
+        raise FileNotFoundError(f"Brak obrazów kalibracyjnych w {calibration_dir}")
+
+    input_name = ort.InferenceSession(
+        model_path, providers=['CPUExecutionProvider']
+    ).get_inputs()[0].name
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # Zalecany przez ORT pre-processing: inferencja kształtów + fuzja Conv/BN przed kwantyzacją
+        prepared_path = os.path.join(tmp_dir, 'model_prepared.onnx')
+        quant_pre_process(model_path, prepared_path)
+        quantize_static(
+            prepared_path,
+            output_path,
+            TileCalibrationReader(input_name, image_paths),
+            quant_format=QuantFormat.QDQ,
+            per_channel=True,
+            weight_type=QuantType.QInt8,
+            activation_type=QuantType.QUInt8,
+        )
+    print(f"✓ Zapisano {output_path} (kalibracja na {len(image_paths)} obrazach)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Kwantyzacja modelu ONNX do int8 (QDQ)")
+    parser.add_argument('--model', default=DEFAULT_MODEL)
+    parser.add_argument('--output', default=DEFAULT_OUTPUT)
+    parser.add_argument('--calibration-dir', default=DEFAULT_CALIBRATION_DIR)
+    parser.add_argument('--samples', type=int, default=DEFAULT_SAMPLES)
+    args = parser.parse_args()
+    quantize(args.model, args.output, args.calibration_dir, args.samples)
+
+
+if __name__ == "__main__":
+    main()
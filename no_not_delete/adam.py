@@ -2,9 +2,29 @@ import json
 import os
 import csv
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from PIL import Image
 from io import BytesIO
 import math
+import numpy as np
+
+
+# One keep-alive session for all tile requests: the TCP/TLS handshake is paid once
+# per host instead of once per tile.
+_SESSION = requests.Session()
+_SESSION.mount('https://', HTTPAdapter(
+    pool_connections=16,
+    pool_maxsize=64,
+    max_retries=Retry(total=3, backoff_factor=0.2)
+))
+
+_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+_BING_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+}
 
 
 def lat_lng_to_pixel_in_tile(lat, lng, zoom):
@@ -23,6 +43,22 @@ def lat_lng_to_pixel_in_tile(lat, lng, zoom):
     return x_tile, y_tile, pixel_x, pixel_y
 
 
+def lat_lng_to_pixel_in_tile_batch(lats, lngs, zoom):
+    """Vectorized lat_lng_to_pixel_in_tile: rows of (x_tile, y_tile, pixel_x, pixel_y)."""
+    n = 2.0 ** zoom
+    x = (np.asarray(lngs, dtype=np.float64) + 180.0) / 360.0 * n
+    lat_rad = np.radians(np.asarray(lats, dtype=np.float64))
+    y = (1.0 - np.arcsinh(np.tan(lat_rad)) / np.pi) / 2.0 * n
+
+    x_tile = x.astype(np.int64)
+    y_tile = y.astype(np.int64)
+
+    pixel_x = ((x - x_tile) * 256).astype(np.int64)
+    pixel_y = ((y - y_tile) * 256).astype(np.int64)
+
+    return np.stack([x_tile, y_tile, pixel_x, pixel_y], axis=1).tolist()
+
+
 def calculate_polygon_center(coordinates):
     """Calculate the center point of a polygon."""
     # Handle both Polygon and MultiPolygon
@@ -33,27 +69,25 @@ def calculate_polygon_center(coordinates):
         # It's a simple list of coordinates
         polygon = coordinates
 
-    lngs = [point[0] for point in polygon]
-    lats = [point[1] for point in polygon]
-
-    center_lng = sum(lngs) / len(lngs)
-    center_lat = sum(lats) / len(lats)
+    # Średnia po wszystkich wierzchołkach, łącznie z punktem zamykającym pierścień -
+    # tak samo liczy backend (OverpassService.calculateCentroid), więc nazwy plików
+    # i współrzędne kafelków zgadzają się z tym, co później trafia do API
+    pts = np.asarray(polygon, dtype=np.float64)
+    center_lng, center_lat = pts[:, :2].mean(axis=0)
 
-    return center_lat, center_lng
+    return float(center_lat), float(center_lng)
 
 
-def download_satellite_image(lat, lng, output_path, size=100, zoom=20):
+def download_satellite_image(lat, lng, output_path, size=100, zoom=20, tile_position=None):
     """Download satellite image using Google Satellite tiles."""
-    x_tile, y_tile, pixel_x, pixel_y = lat_lng_to_pixel_in_tile(lat, lng, zoom)
+    if tile_position is None:
+        tile_position = lat_lng_to_pixel_in_tile(lat, lng, zoom)
+    x_tile, y_tile, pixel_x, pixel_y = tile_position
     tiles_needed = 2
     tile_size = 256
     combined_size = tile_size * tiles_needed
     combined_image = Image.new('RGB', (combined_size, combined_size))
 
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-    }
-
     for i in range(tiles_needed):
         for j in range(tiles_needed):
             tx = x_tile - tiles_needed // 2 + i
@@ -62,7 +96,7 @@ def download_satellite_image(lat, lng, output_path, size=100, zoom=20):
             url = f"https://mt1.google.com/vt/lyrs=s&x={tx}&y={ty}&z={zoom}"
 
             try:
-                response = requests.get(url, headers=headers, timeout=30)
+                response = _SESSION.get(url, headers=_HEADERS, timeout=30)
                 response.raise_for_status()
                 tile_img = Image.open(BytesIO(response.content))
                 combined_image.paste(tile_img, (i * tile_size, j * tile_size))
@@ -89,7 +123,7 @@ def download_satellite_image(lat, lng, output_path, size=100, zoom=20):
     return True
 
 
-def download_satellite_image_bing(lat, lng, output_path, size=100, zoom=20):
+def download_satellite_image_bing(lat, lng, output_path, size=100, zoom=20, tile_position=None):
     """Fallback: Download satellite image using Bing Maps tiles."""
 
     def tile_to_quadkey(x, y, z):
@@ -104,17 +138,15 @@ def download_satellite_image_bing(lat, lng, output_path, size=100, zoom=20):
             quadkey += str(digit)
         return quadkey
 
-    x_tile, y_tile, pixel_x, pixel_y = lat_lng_to_pixel_in_tile(lat, lng, zoom)
+    if tile_position is None:
+        tile_position = lat_lng_to_pixel_in_tile(lat, lng, zoom)
+    x_tile, y_tile, pixel_x, pixel_y = tile_position
 
     tiles_needed = 2
     tile_size = 256
     combined_size = tile_size * tiles_needed
     combined_image = Image.new('RGB', (combined_size, combined_size))
 
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-    }
-
     for i in range(tiles_needed):
         for j in range(tiles_needed):
             tx = x_tile - tiles_needed // 2 + i
@@ -124,7 +156,7 @@ def download_satellite_image_bing(lat, lng, output_path, size=100, zoom=20):
             url = f"https://ecn.t0.tiles.virtualearth.net/tiles/a{quadkey}.jpeg?g=1"
 
             try:
-                response = requests.get(url, headers=headers, timeout=30)
+                response = _SESSION.get(url, headers=_BING_HEADERS, timeout=30)
                 response.raise_for_status()
                 tile_img = Image.open(BytesIO(response.content))
                 if tile_img.mode != 'RGB':
@@ -202,6 +234,7 @@ def main():
     csv_data = []
     successful = 0
     failed = 0
+    downloads = []
 
     for i, building in enumerate(buildings):
         # Extract geometry and asbestos info
@@ -257,16 +290,39 @@ def main():
                 print(f"  Skipping building {i}: Error calculating center - {e}")
                 continue
 
-            # Create filename
-            filename = f"{lat:.7f}_{lng:.7f}.png"
-            output_path = os.path.join(output_dir, filename)
-
-            print(f"Downloading image {i + 1}/{len(buildings)}: {filename} (asbestos: {has_asbestos})")
-
-            # Download image
+            downloads.append((i, lat, lng, has_asbestos))
+
+    # Tile coordinates for all buildings at once, before any download starts
+    tile_positions = lat_lng_to_pixel_in_tile_batch(
+        [lat for _, lat, _, _ in downloads],
+        [lng for _, _, lng, _ in downloads],
+        20
+    )
+
+    for (i, lat, lng, has_asbestos), tile_position in zip(downloads, tile_positions):
+        # Create filename
+        filename = f"{lat:.7f}_{lng:.7f}.png"
+        output_path = os.path.join(output_dir, filename)
+
+        print(f"Downloading image {i + 1}/{len(buildings)}: {filename} (asbestos: {has_asbestos})")
+
+        # Download image
+        try:
+            if download_satellite_image(lat, lng, output_path, size=128, zoom=20, tile_position=tile_position):
+                print(f"  ✓ Saved: {filename}")
+                successful += 1
+                csv_data.append({
+                    'filename': filename,
+                    'latitude': lat,
+                    'longitude': lng,
+                    'has_asbestos': has_asbestos
+                })
+            else:
+                raise Exception("Google failed")
+        except:
             try:
-                if download_satellite_image(lat, lng, output_path, size=128, zoom=20):
-                    print(f"  ✓ Saved: {filename}")
+                if download_satellite_image_bing(lat, lng, output_path, size=128, zoom=20, tile_position=tile_position):
+                    print(f"  ✓ Saved (Bing): {filename}")
                     successful += 1
                     csv_data.append({
                         'filename': filename,
@@ -275,24 +331,11 @@ def main():
                         'has_asbestos': has_asbestos
                     })
                 else:
-                    raise Exception("Google failed")
-            except:
-                try:
-                    if download_satellite_image_bing(lat, lng, output_path, size=128, zoom=20):
-                        print(f"  ✓ Saved (Bing): {filename}")
-                        successful += 1
-                        csv_data.append({
-                            'filename': filename,
-                            'latitude': lat,
-                            'longitude': lng,
-                            'has_asbestos': has_asbestos
-                        })
-                    else:
-                        print(f"  ✗ Failed: {filename}")
-                        failed += 1
-                except Exception as e:
-                    print(f"  ✗ Failed: {filename} - {e}")
+                    print(f"  ✗ Failed: {filename}")
                     failed += 1
+            except Exception as e:
+                print(f"  ✗ Failed: {filename} - {e}")
+                failed += 1
 
     # Save CSV
     print(f"\nSaving labels to {csv_path}...")